@@ -1,11 +1,40 @@
+import re
+import numpy as np
 import pandas as pd
 from datetime import datetime
-from dateutil.relativedelta import relativedelta # For calculating the end of the month
 
 # Ensure you have these libraries installed:
-# pip install pandas python-dateutil
+# pip install pandas
 
-def load_prepayment_schedule(file_path: str) -> pd.DataFrame | None:
+# Month column headers in the input CSV, e.g., 'Jan-24' (MMM-YY).
+_MONTH_RE = re.compile(r'^[A-Za-z]{3}-\d{2}$')
+
+# Columns of the generated accounting entries, in output order.
+_OUTPUT_COLUMNS = ['Date', 'Description', 'Reference', 'Account', 'Amount']
+
+
+def _read_schedule_csv(file_path: str, month_columns: list[str], chunksize: int | None,
+                       **read_kwargs) -> pd.DataFrame:
+    """
+    Reads the schedule CSV in one go, or in chunks of `chunksize` rows when set. When chunked, rows with no
+    amortization in any month (e.g., a blank summary row) can never produce entries, so they are dropped from
+    each chunk before it is kept. Peak memory is then about one chunk plus the rows that amortize, rather
+    than the whole file.
+    """
+    if chunksize is None:
+        return pd.read_csv(file_path, **read_kwargs)
+    surviving_chunks = []
+    with pd.read_csv(file_path, chunksize=chunksize, **read_kwargs) as reader:
+        for chunk in reader:
+            amounts = chunk[month_columns].apply(pd.to_numeric, errors='coerce').fillna(0)
+            surviving_chunks.append(chunk[amounts.ne(0).any(axis=1)])
+    if not surviving_chunks:
+        return pd.read_csv(file_path, nrows=0, **read_kwargs)
+    return pd.concat(surviving_chunks, ignore_index=True)
+
+
+def load_prepayment_schedule(file_path: str,
+                             chunksize: int | None = None) -> tuple[pd.DataFrame, dict[pd.Period, str]] | tuple[None, None]:
     """
     Loads the prepayment schedule from the CSV, handling its specific multi-row header.
     It identifies month columns and renames key columns for easier access.
@@ -13,18 +42,63 @@ def load_prepayment_schedule(file_path: str) -> pd.DataFrame | None:
     Args:
         file_path (str): Path to the CSV file. Expects headers like 'Items', 'Invoice number',
                          'Invoice amount', and month columns (e.g., 'Jan-24').
+        chunksize (int | None): If set, read the CSV this many rows at a time (for very large files), keeping
+                                only the rows that amortize in at least one month. Defaults to None,
+                                reading the whole file at once.
 
     Returns:
-        pd.DataFrame | None: Processed DataFrame, or None on error.
+        tuple[pd.DataFrame, dict[pd.Period, str]] | tuple[None, None]: Processed DataFrame and the month
+            columns keyed by their monthly period (e.g., {Period('2024-01', 'M'): 'Jan-24'}), or (None, None) on error.
     """
     try:
-        # Read the CSV, skipping the first 2 header rows to get to the actual column names.
-        df = pd.read_csv(file_path, skiprows=2)
+        # Read only the header row first (skipping the first 2 header rows to get to the actual
+        # column names), so the month columns can be typed up front.
+        header = pd.read_csv(file_path, skiprows=2, nrows=0).columns
 
-        # Drop the last row if it's the "Balance" summary row.
+        # Identify month columns dynamically.
+        # Filter for columns that represent months, e.g., 'Jan-24', 'Feb-24'
+        # Basic check: 3 alphabetic chars, '-', 2 digits (MMM-YY), matched against the whole header at once.
+        month_candidates = header[header.str.match(_MONTH_RE)]
+        # Parse the headers into monthly periods once, so months are looked up by date rather than by their
+        # 'MMM-YY' spelling. Headers that only look like months (e.g., 'Abc-24') are not treated as month columns.
+        month_periods = pd.to_datetime(month_candidates, format='%b-%y', errors='coerce').to_period('M')
+        month_columns = month_candidates[month_periods.notna()].tolist()
+        month_periods = month_periods[month_periods.notna()]
+        if not month_columns:
+            print("Warning: No month columns (e.g., 'Jan-24') found in the CSV. Please check header format.")
+            raise ValueError("Required month columns are missing in the CSV.")
+        # Month names parse case-insensitively, so e.g. 'Jan-24' and 'JAN-24' would both be January 2024;
+        # refuse such a schedule rather than silently picking one of the columns.
+        duplicated_months = month_periods.duplicated(keep=False)
+        if duplicated_months.any():
+            duplicate_columns = [col for col, is_dup in zip(month_columns, duplicated_months) if is_dup]
+            raise ValueError(f"Several month columns refer to the same month: {', '.join(duplicate_columns)}.")
+
+        # Declare the known schema so pandas doesn't have to infer it, and only read the columns we use
+        # (e.g., the trailing 'Balance' totals column is skipped). 'Invoice number' and 'Invoice amount' are
+        # not declared as floats: invoice numbers may be alphanumeric (e.g., '46248-A'), and 'Reference' is
+        # coerced separately below, so they must not force the untyped re-read meant for bad amounts.
+        column_dtypes = {'Items': str} | {col: 'float64' for col in month_columns}
+        usecols = [col for col in header if col in column_dtypes or col in ('Invoice number', 'Invoice amount')]
+        # The summary row carries its 'Balance' label in a numeric column (e.g., under 'Dec-24'); read it
+        # as missing so that row still parses under the declared float types.
+        na_values = {col: ['Balance'] for col in usecols if col != 'Items'}
+        try:
+            df = _read_schedule_csv(file_path, month_columns, chunksize, skiprows=2, usecols=usecols,
+                                    dtype=column_dtypes, na_values=na_values)
+        except ValueError:
+            # A malformed (non-numeric) cell doesn't fit the declared types; read untyped and coerce only
+            # the month columns the parser couldn't read as numbers, leaving the already-numeric ones as is.
+            print("Note: Some amounts in the CSV are not numeric; they are treated as 0.")
+            df = _read_schedule_csv(file_path, month_columns, chunksize, skiprows=2, usecols=usecols,
+                                    na_values=na_values)
+            text_columns = [col for col in month_columns if not pd.api.types.is_numeric_dtype(df[col])]
+            df[text_columns] = df[text_columns].apply(pd.to_numeric, errors='coerce')
+
+        # Drop the last row if it's the "Balance" summary row (when chunked, it sits in the last chunk).
         # Check if the first column of the last row is 'Balance' or similar.
-        if df.iloc[-1, 0] == 'Balance':
-            df = df.drop(df.tail(1).index)
+        if not df.empty and df.iat[-1, 0] == 'Balance':
+            df = df.iloc[:-1]
             print("Note: Removed the 'Balance' summary row from the CSV data.")
 
         # Rename columns for clarity and consistency with the previous structure, if desired.
@@ -37,42 +111,39 @@ def load_prepayment_schedule(file_path: str) -> pd.DataFrame | None:
 
         # --- START OF ADDITION FOR REFERENCE NUMBER ---
         if 'Reference' in df.columns:
-            # Convert 'Reference' to numeric, coercing non-numeric values to NaN.
-            df['Reference'] = pd.to_numeric(df['Reference'], errors='coerce')
-            # Convert to Pandas' nullable integer type ('Int64') to handle NaNs and keep as whole numbers.
-            df['Reference'] = df['Reference'].astype('Int64')
+            # Convert 'Reference' to numeric (unless the typed read already did), coercing non-numeric values to NaN.
+            # It is kept as float64 here (NaN for missing) and only formatted as a whole number
+            # for the rows that actually produce entries, avoiding a nullable 'Int64' conversion.
+            if not pd.api.types.is_numeric_dtype(df['Reference']):
+                df['Reference'] = pd.to_numeric(df['Reference'], errors='coerce')
+            # Validate once, vectorized: a reference must be a finite whole number that float64 holds exactly
+            # (e.g., 123.7 or inf are not). Invalid references are set to NaN, so they are shown as 'N/A'.
+            ref = df['Reference'].to_numpy(dtype=np.float64)
+            valid_ref = np.isfinite(ref) & (ref == np.floor(ref)) & (np.abs(ref) <= 2 ** 53)
+            invalid_ref = ~valid_ref & ~np.isnan(ref)
+            if invalid_ref.any():
+                print(f"Note: {invalid_ref.sum()} 'Invoice number' value(s) are not whole numbers; "
+                      f"they are shown as 'N/A'.")
+                df['Reference'] = np.where(valid_ref, ref, np.nan)
         else:
             print("Warning: 'Invoice number' (mapped to 'Reference') column not found.")
-            df['Reference'] = 'N/A' # Default if column is missing
+            df['Reference'] = np.nan # Default if column is missing, formatted as 'N/A' in the output
         # --- END OF ADDITION FOR REFERENCE NUMBER ---
 
-        # Identify month columns dynamically.
-        # Filter for columns that represent months, e.g., 'Jan-24', 'Feb-24'
-        # Basic check: contains '-', length 6 (MMM-YY), first 3 chars are alphabetic
-        month_columns = [
-            col for col in df.columns
-            if len(col) == 6 and '-' in col and col.split('-')[0].isalpha() and col.split('-')[1].isdigit()
-        ]
-        if not month_columns:
-            print("Warning: No month columns (e.g., 'Jan-24') found in the CSV. Please check header format.")
-            raise ValueError("Required month columns are missing in the CSV.")
+        # Fill NaN with 0 in the month columns, as empty cells mean 0 amortization.
+        df[month_columns] = df[month_columns].fillna(0.0)
 
-        # Ensure numeric type for month columns and fill NaN with 0, as empty cells mean 0 amortization.
-        for col in month_columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-
-        # Ensure 'Prepayment Item' and 'Reference' are present after renaming
+        # Ensure 'Prepayment Item' and 'Reference' are present after renaming ('Reference' is defaulted above),
+        # so generate_accounting_entries can access both columns directly without any per-row defaulting.
         if 'Prepayment Item' not in df.columns:
             df['Prepayment Item'] = 'Generic Item'
             print("Note: 'Prepayment Item' column not found, defaulting to 'Generic Item'.")
-        # The 'Reference' column handling is now above this point, so this check might be redundant if always present,
-        # but kept for consistency with the user's provided structure.
-        # if 'Reference' not in df.columns:
-        #     df['Reference'] = 'N/A'
-        #     print("Note: 'Reference' column not found, defaulting to 'N/A'.")
 
         print(f"Successfully loaded {len(df)} records from {file_path}")
-        return df, month_columns # Return month columns too, as they define the data we need
+        # Return month columns too, as they define the data we need. A dict keyed by period keeps their order
+        # while making "is this month in the schedule?" an O(1) lookup for every later call.
+        period_to_col = dict(zip(month_periods, month_columns))
+        return df, period_to_col
 
     except FileNotFoundError:
         print(f"Error: The specified file '{file_path}' was not found. Please ensure the path is correct.")
@@ -88,120 +159,142 @@ def load_prepayment_schedule(file_path: str) -> pd.DataFrame | None:
         return None, None
 
 
-def generate_accounting_entries(schedule_df: pd.DataFrame, month_columns: list[str], target_month_str: str) -> list[dict]:
+def generate_accounting_entries(schedule_df: pd.DataFrame, month_columns: dict[pd.Period, str],
+                                target_month_str: str) -> pd.DataFrame:
     """
     Generates accounting entries for prepaid items based on pre-calculated amounts in month columns.
 
     Args:
         schedule_df (pd.DataFrame): DataFrame containing the prepayment schedule with monthly amounts.
-        month_columns (list[str]): List of column names that represent the months (e.g., 'Jan-24').
+        month_columns (dict[pd.Period, str]): Column names that represent the months (e.g., 'Jan-24'), keyed by
+                                              their monthly period, as returned by load_prepayment_schedule.
         target_month_str (str): The specific month for which to generate entries, in 'YYYY-MM' format
                                 (e.g., '2024-05').
 
     Returns:
-        list[dict]: A list of dictionaries, where each dictionary represents an accounting entry.
-                    Returns an empty list if no entries are generated or if the target_month_str is invalid.
+        pd.DataFrame: One row per accounting entry, built column by column with pre-typed arrays and
+                      already in output column order (Date, Description, Reference, Account, Amount).
+                      Returns an empty DataFrame if no entries are generated or if the target_month_str is invalid.
     """
-    entries = []
-
     try:
-        # Convert the target_month_str (e.g., '2024-05') to a format matching CSV month headers (e.g., 'May-24').
-        # First, parse to a datetime object.
+        # Parse the target_month_str (e.g., '2024-05') strictly as 'YYYY-MM', then take its monthly period
+        # to look up the matching CSV month column (e.g., 'May-24') without any string formatting.
         target_dt = datetime.strptime(target_month_str, '%Y-%m')
-        # Then, format it to 'MMM-YY' (e.g., 'May-24').
-        # Use %b for abbreviated month name (Jan, Feb, etc.) and %y for 2-digit year.
-        target_month_col_name = target_dt.strftime('%b-%y')
+        target_period = pd.Period(target_dt, freq='M')
     except ValueError:
         print(f"Error: Invalid target month format '{target_month_str}'. Please use 'YYYY-MM' (e.g., '2024-05').")
-        return []
+        return pd.DataFrame(columns=_OUTPUT_COLUMNS)
 
-    # Get the last day of the target month for the accounting entry date.
-    accounting_entry_date = target_dt + relativedelta(day=31)
+    # Get the last day of the target month for the accounting entry date, from the month's period.
+    accounting_entry_date = target_period.end_time
+    # Every entry for the month shares this date, so format it once (DD/MM/YYYY).
+    date_str = accounting_entry_date.strftime('%d/%m/%Y')
 
     # Check if the target month column exists in the DataFrame.
-    if target_month_col_name not in month_columns: 
-        print(f"Warning: The month '{target_month_col_name}' is not found as a column in the input schedule. "
+    target_month_col_name = month_columns.get(target_period)
+    if target_month_col_name is None:
+        print(f"Warning: The month '{target_period.strftime('%b-%y')}' is not found as a column in the input schedule. "
               f"No entries can be generated for this month.")
-        return []
-
-    # Iterate through each row (prepayment item) in the DataFrame.
-    for index, row in schedule_df.iterrows():
-        prepayment_item = row.get('Prepayment Item', 'Unknown Item')
-        # --- START OF MODIFICATION FOR REFERENCE NUMBER ---
-        raw_reference = row.get('Reference', pd.NA) # Get the reference, which is now Int64 or pd.NA
-        # Convert to string: if it's a valid number, convert to int then string (e.g., 46248 -> '46248').
-        # If it's pd.NA (missing/invalid), default to 'N/A'.
-        reference_str = str(int(raw_reference)) if pd.notna(raw_reference) else 'N/A'
-        # --- END OF MODIFICATION FOR REFERENCE NUMBER ---
-
-
-        # Get the pre-calculated monthly amortization amount for the target month.
-        # Use .get() with a default of 0 in case the column exists but has a NaN (should be handled by fillna above).
-        monthly_amortization = row.get(target_month_col_name, 0)
-
-        # Only generate entries if there's an actual amortization amount for this month.
-        # We use a small epsilon for floating-point comparison, though round() helps.
-        if abs(monthly_amortization) > 0.005: # Check if amount is significantly non-zero
-            # The CSV shows negative amounts for amortization, so take the absolute value for the debit.
-            debit_amount = abs(round(monthly_amortization, 2))
-
-            # Entry 1: Debit (Increase) to an Expense Account
-            entries.append({
-                'Date': accounting_entry_date.strftime('%d/%m/%Y'), # Format as DD/MM/YYYY
-                'Description': f'Prepayment amortisation for {prepayment_item}',
-                'Reference': reference_str, # Use the string formatted reference
-                'Account': 'EXP001', # Example expense account code
-                'Amount': debit_amount
-            })
-            # Entry 2: Credit (Decrease) to a Prepayment Asset Account
-            
-            entries.append({
-                'Date': accounting_entry_date.strftime('%d/%m/%Y'),
-                'Description': f'Prepayment amortisation for {prepayment_item}',
-                'Reference': reference_str, # Use the string formatted reference
-                'Account': 'PRE001', # Example prepayment asset account code
-                'Amount': -debit_amount # The credit amount will be negative of the debit amount to balance the entry.
-            })
-    return entries
+        return pd.DataFrame(columns=_OUTPUT_COLUMNS)
+
+    # Only the item, its reference and the target month are needed; work on that thin slice
+    # rather than the full (possibly many-month-wide) schedule.
+    schedule = schedule_df[['Prepayment Item', 'Reference', target_month_col_name]]
+
+    # The CSV shows negative amounts for amortization, so take the absolute value for the debit.
+    # Rounding and abs run as one NumPy pass over the whole target month column.
+    amounts = schedule[target_month_col_name].to_numpy(dtype=np.float64, copy=False)
+    debit = np.abs(np.round(amounts, 2))
+
+    # Keep only the rows with an actual amortization amount for this month.
+    # We use a small epsilon for floating-point comparison, though round() helps.
+    mask = debit > 0.005
+    sub = schedule.loc[mask]
+    debit = debit[mask]
+    # Reference is a whole-number float64 or NaN (validated at load time); format valid numbers as
+    # whole-number strings (e.g., 46248.0 -> '46248') and default missing ones to 'N/A'.
+    # Only the surviving rows are formatted.
+    ref = sub['Reference'].to_numpy(dtype=np.float64)
+    has_ref = ~np.isnan(ref)
+    ref_str = np.full(len(ref), 'N/A', dtype=object)
+    ref_str[has_ref] = ref[has_ref].astype(np.int64).astype(str)
+    # A blank item name defaults to 'Unknown Item', so the description never ends up missing.
+    desc = ('Prepayment amortisation for ' + sub['Prepayment Item'].fillna('Unknown Item').astype(str)).to_numpy()
+
+    # Build the debit (EXP001, expense) and credit (PRE001, prepayment asset) entries side by side,
+    # two output rows per item. The credit is the negative of the debit to balance the entry.
+    # Debits go to the even rows and credits to the odd rows with strided writes, no per-row branching.
+    entry_count = 2 * len(sub)
+    entry_amounts = np.empty(entry_count, dtype=np.float64)
+    entry_amounts[0::2] = debit
+    entry_amounts[1::2] = -debit
+
+    # Description repeats per item and Account only ever has two values, so both are stored as 'category'
+    # (each distinct string is kept once, plus a small integer code per entry).
+    desc_codes, desc_categories = pd.factorize(desc)
+    descriptions = pd.Categorical.from_codes(np.repeat(desc_codes, 2), categories=desc_categories)
+    accounts = pd.Categorical.from_codes(np.tile([0, 1], len(sub)), categories=['EXP001', 'PRE001'])
+
+    # Columns are passed as typed arrays so pandas doesn't need to infer dtypes from Python objects.
+    entries_df = pd.DataFrame({
+        'Date': pd.array(np.repeat(date_str, entry_count), dtype='string'),
+        'Description': descriptions,
+        'Reference': pd.array(np.repeat(ref_str, 2), dtype='string'),
+        'Account': accounts,
+        'Amount': entry_amounts
+    }, columns=_OUTPUT_COLUMNS)
+    return entries_df
+
+
+def export_accounting_entries(schedule_df: pd.DataFrame, month_columns: dict[pd.Period, str],
+                              target_month_str: str) -> None:
+    """
+    Generates the accounting entries for one target month from an already loaded schedule,
+    displays them and saves them to a month-specific CSV file.
+
+    Args:
+        schedule_df (pd.DataFrame): Prepayment schedule, as returned by load_prepayment_schedule.
+        month_columns (dict[pd.Period, str]): Month columns, as returned by load_prepayment_schedule.
+        target_month_str (str): The month to generate entries for, in 'YYYY-MM' format (e.g., '2024-05').
+    """
+    print(f"\nAttempting to generate accounting entries for {target_month_str}...")
+    entries_df = generate_accounting_entries(schedule_df, month_columns, target_month_str)
+
+    if not entries_df.empty:
+        print("\n--- Generated Accounting Entries ---")
+        print(entries_df.to_string(index=False)) # Print without pandas index
+
+        # Optional: Save the output to a new CSV file.
+        output_filename = f"accounting_entries_{target_month_str}.csv"
+        try:
+            entries_df.to_csv(output_filename, index=False)
+            print(f"\nSuccessfully saved accounting entries to '{output_filename}'")
+        except Exception as e:
+            print(f"Error saving entries to CSV: {e}")
+    else:
+        print("No accounting entries generated for the specified month. "
+              "Check if amortization amounts exist for this period in the schedule or if the month format is correct.")
 
 
 def main():
     """
     Main function to orchestrate the prepayment automation process.
-    Handles user interaction, calls data loading and entry generation functions,
-    and manages the display and optional saving of the generated accounting entries.
+    Handles user interaction, loads the prepayment schedule once and then generates, displays
+    and saves the accounting entries for each requested target month.
     """
     csv_file_path = 'Prepayment assignment.csv'
-    target_month_input = input("Enter the target month for amortization (YYYY-MM, e.g., 2024-05): ")
+    csv_chunksize = None # Set to a row count (e.g., 100_000) to read very large schedules in chunks
+    target_month_input = input("Enter the target month(s) for amortization "
+                               "(YYYY-MM, comma-separated for several, e.g., 2024-05 or 2024-05,2024-06): ")
+    target_months = [month.strip() for month in target_month_input.split(',')]
 
-    # Load the prepayment schedule and get the list of month columns
-    schedule_df, month_columns = load_prepayment_schedule(csv_file_path)
+    # Load the prepayment schedule and get the month columns. It is loaded only once and reused
+    # for every target month, since parsing the CSV is the most expensive step.
+    schedule_df, month_columns = load_prepayment_schedule(csv_file_path, chunksize=csv_chunksize)
 
     if schedule_df is not None and month_columns is not None:
-        print(f"\nAttempting to generate accounting entries for {target_month_input}...")
-        accounting_entries = generate_accounting_entries(schedule_df, month_columns, target_month_input)
-
-        if accounting_entries:
-            # Convert the list of dictionaries into a pandas DataFrame for structured output.
-            entries_df = pd.DataFrame(accounting_entries)
-
-            # Define the desired order of columns for the output.
-            output_columns = ['Date', 'Description', 'Reference', 'Account', 'Amount']
-            entries_df = entries_df[output_columns]
-
-            print("\n--- Generated Accounting Entries ---")
-            print(entries_df.to_string(index=False)) # Print without pandas index
-
-            # Optional: Save the output to a new CSV file.
-            output_filename = f"accounting_entries_{target_month_input}.csv"
-            try:
-                entries_df.to_csv(output_filename, index=False)
-                print(f"\nSuccessfully saved accounting entries to '{output_filename}'")
-            except Exception as e:
-                print(f"Error saving entries to CSV: {e}")
-        else:
-            print("No accounting entries generated for the specified month. "
-                  "Check if amortization amounts exist for this period in the schedule or if the month format is correct.")
+        for target_month in target_months:
+            export_accounting_entries(schedule_df, month_columns, target_month)
     else:
         print("\nCould not proceed with generating entries due to errors loading the prepayment schedule.")
 